@@ -79,13 +79,14 @@ class OptimizedRailwayMigration:
             total_chunks = duck_conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
             print(f"  📤 Exportiere {total_chunks:,} Chunks aus DuckDB...")
             
-            # OPTIMIERTE Batch-Verarbeitung
-            offset = 0
+            # OPTIMIERTE Batch-Verarbeitung (Keyset statt OFFSET: jeder Batch
+            # setzt bei der letzten chunk_id an, statt alle vorherigen zu überspringen)
+            last_chunk_id = ''
             processed = 0
             
-            while offset < total_chunks:
+            while True:
                 # Größere Batches für bessere Performance
-                batch_data = duck_conn.execute(f"""
+                batch_data = duck_conn.execute("""
                     SELECT 
                         chunk_id, speech_id, debate_id, speaker_name, speaker_party,
                         debate_title, debate_date, chunk_text, chunk_index, total_chunks,
@@ -93,9 +94,10 @@ class OptimizedRailwayMigration:
                         frame_label, annotation_confidence, annotation_notes,
                         created_at, updated_at
                     FROM chunks 
+                    WHERE chunk_id > ?
                     ORDER BY chunk_id
-                    LIMIT {self.batch_size} OFFSET {offset}
-                """).fetchall()
+                    LIMIT ?
+                """, [last_chunk_id, self.batch_size]).fetchall()
                 
                 if not batch_data:
                     break
@@ -104,7 +106,7 @@ class OptimizedRailwayMigration:
                 self.insert_chunks_batch(pg_cursor, batch_data)
                 
                 processed += len(batch_data)
-                offset += self.batch_size
+                last_chunk_id = batch_data[-1][0]
                 
                 print(f"  📥 Importiert: {processed:,}/{total_chunks:,} Chunks ({processed/total_chunks*100:.1f}%)")
             
@@ -6,7 +6,7 @@ Synchronisiert annotierte Daten von Railway zurück in lokale DuckDB
 
 import duckdb
 import psycopg2
-from psycopg2.extras import RealDictCursor
+import pyarrow as pa
 import argparse
 from pathlib import Path
 import shutil
@@ -15,6 +15,14 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+# Zeilen pro Roundtrip beim Streamen der Railway-Chunks (serverseitiger Cursor)
+SYNC_FETCH_SIZE = 2000
+
+def rows_to_arrow(cursor, rows):
+    """Baut aus Cursor-Zeilen eine spaltenorientierte Arrow-Tabelle für DuckDB"""
+    columns = [desc[0] for desc in cursor.description]
+    return pa.table({name: list(values) for name, values in zip(columns, zip(*rows))})
+
 class RailwayToLocalSync:
     def __init__(self, local_duckdb_path: str, postgres_url: str):
         self.local_duckdb_path = local_duckdb_path
@@ -37,28 +45,54 @@ class RailwayToLocalSync:
         
         # PostgreSQL Verbindung zu Railway
         pg_conn = psycopg2.connect(self.postgres_url)
-        pg_cursor = pg_conn.cursor(cursor_factory=RealDictCursor)
+        pg_cursor = pg_conn.cursor()
         
         # DuckDB Verbindung zur finalen DB
         duck_conn = duckdb.connect(final_db_path)
         
         try:
-            # Hole annotierte Chunks von Railway
+            # Hole annotierte Chunks von Railway (nur die Annotations-Spalten,
+            # chunk_text & Co. liegen lokal bereits vor). Der benannte Cursor
+            # streamt die Zeilen, statt das gesamte Ergebnis im Client zu halten.
             print("📥 Lade annotierte Chunks von Railway...")
-            pg_cursor.execute("""
+            chunk_cursor = pg_conn.cursor(name="railway_chunks")
+            chunk_cursor.itersize = SYNC_FETCH_SIZE
+            chunk_cursor.execute("""
                 SELECT 
-                    chunk_id, speech_id, debate_id, speaker_name, speaker_party,
-                    debate_title, debate_date, chunk_text, chunk_index, total_chunks,
-                    word_count, char_count, chunking_method, assigned_user,
-                    frame_label, annotation_confidence, annotation_notes,
-                    created_at, updated_at
+                    chunk_id, assigned_user, frame_label,
+                    annotation_confidence, annotation_notes, updated_at
                 FROM chunks 
                 WHERE assigned_user IS NOT NULL
                 ORDER BY chunk_id
             """)
             
-            railway_chunks = pg_cursor.fetchall()
-            print(f"✅ {len(railway_chunks):,} annotierte Chunks von Railway geladen")
+            # Aktualisiere lokale Chunks mit Railway-Daten
+            print("🔄 Aktualisiere lokale Chunks...")
+            updated_chunks = 0
+            
+            # Pro Batch ein UPDATE ... FROM über eine Arrow-Tabelle statt
+            # eines UPDATE-Statements pro Chunk
+            while True:
+                rows = chunk_cursor.fetchmany(SYNC_FETCH_SIZE)
+                if not rows:
+                    break
+                
+                duck_conn.register("railway_batch", rows_to_arrow(chunk_cursor, rows))
+                duck_conn.execute("""
+                    UPDATE chunks SET
+                        assigned_user = r.assigned_user,
+                        frame_label = r.frame_label,
+                        annotation_confidence = r.annotation_confidence,
+                        annotation_notes = r.annotation_notes,
+                        updated_at = r.updated_at
+                    FROM railway_batch r
+                    WHERE chunks.chunk_id = r.chunk_id
+                """)
+                duck_conn.unregister("railway_batch")
+                updated_chunks += len(rows)
+            
+            chunk_cursor.close()
+            print(f"✅ {updated_chunks:,} Chunks von Railway übernommen")
             
             # Hole Agreement-Daten von Railway
             try:
@@ -75,32 +109,6 @@ class RailwayToLocalSync:
                 railway_agreements = []
                 print("⚠️ Keine Agreement-Daten auf Railway gefunden")
             
-            # Aktualisiere lokale Chunks mit Railway-Daten
-            print("🔄 Aktualisiere lokale Chunks...")
-            updated_chunks = 0
-            
-            for chunk in railway_chunks:
-                # Aktualisiere Chunk mit Railway-Daten
-                duck_conn.execute("""
-                    UPDATE chunks SET
-                        assigned_user = ?,
-                        frame_label = ?,
-                        annotation_confidence = ?,
-                        annotation_notes = ?,
-                        updated_at = ?
-                    WHERE chunk_id = ?
-                """, (
-                    chunk['assigned_user'],
-                    chunk['frame_label'],
-                    chunk['annotation_confidence'],
-                    chunk['annotation_notes'],
-                    chunk['updated_at'],
-                    chunk['chunk_id']
-                ))
-                updated_chunks += 1
-            
-            print(f"✅ {updated_chunks:,} Chunks aktualisiert")
-            
             # Synchronisiere Agreement-Daten
             if railway_agreements:
                 print("🔄 Synchronisiere Agreement-Daten...")
@@ -108,24 +116,19 @@ class RailwayToLocalSync:
                 # Lösche alte Agreement-Daten
                 duck_conn.execute("DELETE FROM agreement_chunks")
                 
-                # Füge Railway Agreement-Daten ein
-                for agreement in railway_agreements:
-                    duck_conn.execute("""
-                        INSERT INTO agreement_chunks (
-                            chunk_id, annotator1, annotator2, label1, label2,
-                            agreement_score, agreement_perfect, created_at, updated_at
-                        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    """, (
-                        agreement['chunk_id'],
-                        agreement['annotator1'],
-                        agreement['annotator2'],
-                        agreement['label1'],
-                        agreement['label2'],
-                        agreement['agreement_score'],
-                        agreement['agreement_perfect'],
-                        agreement['created_at'],
-                        agreement['updated_at']
-                    ))
+                # Füge Railway Agreement-Daten in einem Statement ein
+                duck_conn.register("railway_agreements", rows_to_arrow(pg_cursor, railway_agreements))
+                duck_conn.execute("""
+                    INSERT INTO agreement_chunks (
+                        chunk_id, annotator1, annotator2, label1, label2,
+                        agreement_score, agreement_perfect, created_at, updated_at
+                    )
+                    SELECT 
+                        chunk_id, annotator1, annotator2, label1, label2,
+                        agreement_score, agreement_perfect, created_at, updated_at
+                    FROM railway_agreements
+                """)
+                duck_conn.unregister("railway_agreements")
                 
                 print(f"✅ {len(railway_agreements):,} Agreement-Daten synchronisiert")
             
@@ -44,11 +44,13 @@ def main():
         '--server.address', '0.0.0.0'
     ]
     
-    print(f"Running command: {' '.join(cmd)}")
+    print(f"Running command: {' '.join(cmd)}", flush=True)
     
+    # Ersetze den Launcher-Prozess durch Streamlit (kein Kindprozess,
+    # Signale wie SIGTERM von Railway gehen direkt an Streamlit)
     try:
-        subprocess.run(cmd, check=True)
-    except subprocess.CalledProcessError as e:
+        os.execvp(cmd[0], cmd)
+    except OSError as e:
         print(f"Error running streamlit: {e}")
         sys.exit(1)
 
@@ -25,6 +25,9 @@ COST_LIMIT = 20.00  # Maximum $20
 INPUT_PRICE_PER_1M = 0.075  # $0.075 per 1M input tokens
 OUTPUT_PRICE_PER_1M = 0.30  # $0.30 per 1M output tokens
 
+# Klassifizierte Debatten pro Transaktion (ein Abbruch verliert höchstens so viele für den Resume)
+COMMIT_INTERVAL = 20
+
 
 # Brexit-Keywords mit Gewichtung
 DIRECT_KEYWORDS = [
@@ -53,6 +56,21 @@ INDIRECT_KEYWORDS = [
 # Kombiniere alle Keywords
 ALL_KEYWORDS = DIRECT_KEYWORDS + INDIRECT_KEYWORDS
 
+# Alle Keywords in einer vorkompilierten Regex: ein Durchlauf über den Text statt einer
+# Suche pro Keyword. Der Lookahead findet auch überlappende Treffer, längere Keywords haben Vorrang.
+_KEYWORD_RE = re.compile(
+    r'(?=\b(' + '|'.join(re.escape(k) for k in sorted(ALL_KEYWORDS, key=len, reverse=True)) + r')\b)'
+)
+
+# Kürzere Keywords, die an derselben Stelle mitgefunden werden (z.B. "brexit" in "brexit-related")
+_KEYWORD_PREFIXES = {
+    keyword: [
+        other for other in ALL_KEYWORDS
+        if other != keyword and keyword.startswith(other) and not keyword[len(other)].isalnum()
+    ]
+    for keyword in ALL_KEYWORDS
+}
+
 
 def analyze_keywords(text):
     """
@@ -64,18 +82,16 @@ def analyze_keywords(text):
 
     text_lower = text.lower()
 
-    # Finde alle Keywords
-    found_direct = []
-    found_indirect = []
+    # Finde alle Keywords (ein Regex-Durchlauf über den kleingeschriebenen Text)
+    found = set()
+    for match in _KEYWORD_RE.finditer(text_lower):
+        keyword = match.group(1)
+        found.add(keyword)
+        found.update(_KEYWORD_PREFIXES[keyword])
 
-    for keyword in DIRECT_KEYWORDS:
-        # Case-insensitive regex search
-        if re.search(r'\b' + re.escape(keyword) + r'\b', text_lower):
-            found_direct.append(keyword)
-
-    for keyword in INDIRECT_KEYWORDS:
-        if re.search(r'\b' + re.escape(keyword) + r'\b', text_lower):
-            found_indirect.append(keyword)
+    # Reihenfolge wie in den Keyword-Listen
+    found_direct = [keyword for keyword in DIRECT_KEYWORDS if keyword in found]
+    found_indirect = [keyword for keyword in INDIRECT_KEYWORDS if keyword in found]
 
     # Berechne Confidence Score
     # Direkte Keywords: höhere Gewichtung
@@ -205,6 +221,14 @@ def setup_output_database(conn_source):
     def get_columns(conn, table_name):
         return {row[1] for row in conn.execute(f"PRAGMA table_info('{table_name}')").fetchall()}
 
+    def copy_table(table_name):
+        # Quelltabelle als Arrow-Stream registrieren und mit einem INSERT ... SELECT
+        # übernehmen, statt jede Zeile einzeln einzufügen
+        reader = conn_source.execute(f"SELECT * FROM {table_name}").fetch_record_batch()
+        conn_out.register("source_rows", reader)
+        conn_out.execute(f"INSERT INTO {table_name} SELECT * FROM source_rows")
+        conn_out.unregister("source_rows")
+
     # Erstelle/öffne Verbindung für Output
     conn_out = duckdb.connect(OUTPUT_DB)
 
@@ -224,9 +248,7 @@ def setup_output_database(conn_source):
             )
             """
         )
-        debates_data = conn_source.execute("SELECT * FROM debates").fetchall()
-        for row in debates_data:
-            conn_out.execute("INSERT INTO debates VALUES (?, ?, ?, ?, ?, ?, ?)", row)
+        copy_table("debates")
     else:
         print("  Tabelle 'debates' vorhanden – überspringe Kopie")
 
@@ -245,9 +267,7 @@ def setup_output_database(conn_source):
             )
             """
         )
-        topics_data = conn_source.execute("SELECT * FROM topics").fetchall()
-        for row in topics_data:
-            conn_out.execute("INSERT INTO topics VALUES (?, ?, ?, ?, ?, ?)", row)
+        copy_table("topics")
     else:
         print("  Tabelle 'topics' vorhanden – überspringe Kopie")
 
@@ -273,9 +293,7 @@ def setup_output_database(conn_source):
             )
             """
         )
-        speeches_data = conn_source.execute("SELECT * FROM speeches").fetchall()
-        for row in speeches_data:
-            conn_out.execute("INSERT INTO speeches VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", row)
+        copy_table("speeches")
     else:
         print("  Tabelle 'speeches' vorhanden – überspringe Kopie")
 
@@ -359,6 +377,10 @@ def main():
     REQUEST_DELAY = 6.0  # Sekunden
     last_api_call_time = 0
 
+    # Updates in Transaktionen zu je COMMIT_INTERVAL Debatten bündeln
+    conn_out.begin()
+    uncommitted_debates = 0
+
     # Verarbeite jede Debatte
     for i, (debate_id, date, debate_name) in enumerate(debates, 1):
         print(f"[{i}/{len(debates)}] {date} - {debate_name[:50]}")
@@ -484,7 +506,12 @@ def main():
             debate_id
         ])
 
-        conn_out.commit()
+        uncommitted_debates += 1
+        if uncommitted_debates >= COMMIT_INTERVAL:
+            conn_out.commit()
+            conn_out.begin()
+            uncommitted_debates = 0
+
         total_processed += 1
 
         print()  # Leerzeile
@@ -493,6 +520,8 @@ def main():
         if cost_limit_reached:
             break
 
+    conn_out.commit()
+
     # Zusammenfassung
     print("=" * 70)
     if cost_limit_reached:
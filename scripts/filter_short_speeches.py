@@ -12,40 +12,74 @@ from pathlib import Path
 INPUT_DB = "data/processed/debates_brexit_filtered.duckdb"
 OUTPUT_DB = "data/processed/debates_brexit_filtered_min20words.duckdb"
 
+# Indizes auf den Referenz-Spalten: (Indexname, Tabelle, Spalte)
+REFERENCE_INDEXES = [
+    ("idx_speeches_debate", "speeches", "debate_id"),
+    ("idx_speeches_topic", "speeches", "topic_id"),
+    ("idx_topics_debate", "topics", "debate_id"),
+]
+
 def count_words(text):
     """Zählt die Wörter in einem Text"""
     if not text:
         return 0
     return len(text.split())
 
-def get_table_schema(conn, table_name):
-    """Holt das Schema einer Tabelle"""
-    schema_info = conn.execute(f"PRAGMA table_info('{table_name}')").fetchall()
-    columns = []
-    for row in schema_info:
-        col_name = row[1]
-        col_type = row[2]
-        is_nullable = row[3] == 0
-        default_value = row[4]
-        is_pk = row[5] == 1
-        
+def get_table_schemas(conn):
+    """
+    Holt das Schema aller Tabellen mit einer einzigen Abfrage
+    Gibt {Tabellenname: [(Spaltenname, Spaltendefinition), ...]} zurück
+    """
+    schema_info = conn.execute("""
+        SELECT
+            c.table_name,
+            c.column_name,
+            c.data_type,
+            c.is_nullable,
+            c.column_default,
+            pk.column_name IS NOT NULL AS is_pk
+        FROM information_schema.columns c
+        JOIN information_schema.tables t
+          ON t.table_catalog = c.table_catalog
+         AND t.table_schema = c.table_schema
+         AND t.table_name = c.table_name
+        LEFT JOIN (
+            SELECT k.table_name, k.column_name
+            FROM information_schema.table_constraints tc
+            JOIN information_schema.key_column_usage k
+              ON k.constraint_name = tc.constraint_name
+             AND k.table_name = tc.table_name
+            WHERE tc.constraint_type = 'PRIMARY KEY'
+        ) pk ON pk.table_name = c.table_name AND pk.column_name = c.column_name
+        WHERE c.table_schema = 'main' AND t.table_type = 'BASE TABLE'
+        ORDER BY c.table_name, c.ordinal_position
+    """).fetchall()
+    
+    schemas = {}
+    for table_name, col_name, col_type, is_nullable, default_value, is_pk in schema_info:
         col_def = f"{col_name} {col_type}"
-        if not is_nullable:
+        if is_nullable == 'NO':
             col_def += " NOT NULL"
         if default_value is not None:
             col_def += f" DEFAULT {default_value}"
         if is_pk:
             col_def += " PRIMARY KEY"
         
-        columns.append(col_def)
+        schemas.setdefault(table_name, []).append((col_name, col_def))
     
-    return columns
+    return schemas
 
 def create_table_from_schema(conn, table_name, columns):
     """Erstellt eine Tabelle basierend auf dem Schema"""
     create_sql = f"CREATE TABLE {table_name} (\n    " + ",\n    ".join(columns) + "\n)"
     conn.execute(create_sql)
 
+def create_reference_indexes(conn, table_columns):
+    """Erstellt Indizes auf debate_id/topic_id, sofern Tabelle und Spalte existieren"""
+    for index_name, table_name, column_name in REFERENCE_INDEXES:
+        if column_name in table_columns.get(table_name, []):
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table_name}({column_name})")
+
 def main():
     print("=" * 70)
     print("FILTERUNG VON KURZEN REDEN (< 20 WÖRTER)")
@@ -65,17 +99,25 @@ def main():
     print(f"Erstelle Output-Datenbank: {OUTPUT_DB}")
     conn_target = duckdb.connect(OUTPUT_DB)
     
-    # Hole alle Tabellennamen
-    tables = [row[0] for row in conn_source.execute("SELECT name FROM sqlite_master WHERE type='table'").fetchall()]
+    # Hole Tabellen und Spalten-Metadaten in einem Schritt
+    schemas = get_table_schemas(conn_source)
+    tables = list(schemas)
+    table_columns = {
+        table_name: [col_name for col_name, _ in columns]
+        for table_name, columns in schemas.items()
+    }
     print(f"Gefundene Tabellen: {', '.join(tables)}")
     
     # Kopiere Schema für alle Tabellen
     print("\nErstelle Tabellenschema...")
     for table_name in tables:
         print(f"  Erstelle Schema für {table_name}...")
-        columns = get_table_schema(conn_source, table_name)
+        columns = [col_def for _, col_def in schemas[table_name]]
         create_table_from_schema(conn_target, table_name, columns)
     
+    print("  Erstelle Indizes...")
+    create_reference_indexes(conn_target, table_columns)
+    
     # Kopiere Daten
     print("\nKopiere und filtere Daten...")
     
@@ -90,31 +132,16 @@ def main():
     speeches = conn_source.execute("SELECT * FROM speeches").fetchall()
     
     # Hole Spaltennamen
-    speech_columns = [row[1] for row in conn_source.execute("PRAGMA table_info('speeches')").fetchall()]
+    speech_columns = table_columns['speeches']
     
     # Finde Index der speech_text Spalte
     speech_text_idx = speech_columns.index('speech_text')
-    speech_id_idx = speech_columns.index('speech_id')
-    debate_id_idx = speech_columns.index('debate_id')
-    topic_id_idx = speech_columns.index('topic_id') if 'topic_id' in speech_columns else None
     
     # Filtere und füge Speeches ein
-    filtered_speeches = []
-    filtered_speech_ids = set()
-    filtered_debate_ids = set()
-    filtered_topic_ids = set()
-    
-    for row in speeches:
-        speech_text = row[speech_text_idx]
-        word_count = count_words(speech_text)
-        
-        if word_count >= 20:
-            filtered_speeches.append(row)
-            filtered_speech_ids.add(row[speech_id_idx])
-            if row[debate_id_idx]:
-                filtered_debate_ids.add(row[debate_id_idx])
-            if topic_id_idx is not None and row[topic_id_idx]:
-                filtered_topic_ids.add(row[topic_id_idx])
+    filtered_speeches = [
+        row for row in speeches
+        if count_words(row[speech_text_idx]) >= 20
+    ]
     
     # Füge gefilterte Speeches ein
     placeholders = ", ".join(["?" for _ in speech_columns])
@@ -126,50 +153,43 @@ def main():
     print(f"    ✓ {len(filtered_speeches):,} Reden kopiert (>= 20 Wörter)")
     print(f"    ✗ {total_speeches_input - len(filtered_speeches):,} Reden gefiltert (< 20 Wörter)")
     
+    # Debates/Topics per Semi-Join direkt in DuckDB kopieren
+    conn_target.execute(f"ATTACH '{INPUT_DB}' AS src (READ_ONLY)")
+    conn_target.execute("""
+        CREATE TEMP TABLE keep_debates AS
+        SELECT DISTINCT debate_id FROM speeches WHERE debate_id IS NOT NULL
+    """)
+    
     # Kopiere nur die zugehörigen Debates
     print("\n  Kopiere zugehörige debates...")
     if "debates" in tables:
-        debates_data = conn_source.execute("SELECT * FROM debates").fetchall()
-        debate_columns = [row[1] for row in conn_source.execute("PRAGMA table_info('debates')").fetchall()]
-        debate_id_idx_debates = debate_columns.index('debate_id')
-        
-        placeholders = ", ".join(["?" for _ in debate_columns])
-        insert_sql = f"INSERT INTO debates VALUES ({placeholders})"
-        
-        debates_copied = 0
-        for row in debates_data:
-            if row[debate_id_idx_debates] in filtered_debate_ids:
-                conn_target.execute(insert_sql, row)
-                debates_copied += 1
+        debates_copied = conn_target.execute("""
+            INSERT INTO debates
+            SELECT d.* FROM src.debates d
+            SEMI JOIN keep_debates k ON d.debate_id = k.debate_id
+        """).fetchone()[0]
         
         print(f"    ✓ {debates_copied:,} debates kopiert")
     
     # Kopiere nur die zugehörigen Topics
     print("  Kopiere zugehörige topics...")
     if "topics" in tables:
-        topics_data = conn_source.execute("SELECT * FROM topics").fetchall()
-        topic_columns = [row[1] for row in conn_source.execute("PRAGMA table_info('topics')").fetchall()]
-        
-        # Filtere Topics nach debate_id und/oder topic_id
-        topic_id_idx_topics = topic_columns.index('topic_id') if 'topic_id' in topic_columns else None
-        debate_id_idx_topics = topic_columns.index('debate_id') if 'debate_id' in topic_columns else None
+        topic_columns = table_columns['topics']
         
-        placeholders = ", ".join(["?" for _ in topic_columns])
-        insert_sql = f"INSERT INTO topics VALUES ({placeholders})"
+        # Filtere Topics nach topic_id und/oder debate_id der gefilterten Speeches
+        conditions = []
+        if 'topic_id' in topic_columns and 'topic_id' in speech_columns:
+            conditions.append("t.topic_id IN (SELECT topic_id FROM speeches)")
+        if 'debate_id' in topic_columns:
+            conditions.append("t.debate_id IN (SELECT debate_id FROM keep_debates)")
         
         topics_copied = 0
-        for row in topics_data:
-            should_copy = False
-            
-            # Prüfe ob Topic zu gefilterten Speeches gehört
-            if topic_id_idx_topics is not None and row[topic_id_idx_topics] in filtered_topic_ids:
-                should_copy = True
-            elif debate_id_idx_topics is not None and row[debate_id_idx_topics] in filtered_debate_ids:
-                should_copy = True
-            
-            if should_copy:
-                conn_target.execute(insert_sql, row)
-                topics_copied += 1
+        if conditions:
+            topics_copied = conn_target.execute(f"""
+                INSERT INTO topics
+                SELECT t.* FROM src.topics t
+                WHERE {" OR ".join(conditions)}
+            """).fetchone()[0]
         
         print(f"    ✓ {topics_copied:,} topics kopiert")
     
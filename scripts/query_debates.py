@@ -3,26 +3,54 @@
 Beispiel-Abfragen für die Debates-Datenbank
 """
 
+import os
+
 import duckdb
 
 DB_FILE = "../data/processed/debates.duckdb"
 
+# DuckDB-Ressourcen für die Aggregationen (parallele Scans, Hash-Aggregate im RAM)
+DUCKDB_THREADS = os.cpu_count() or 1
+DUCKDB_MEMORY_LIMIT = "8GB"
+
 
 def main():
     conn = duckdb.connect(DB_FILE, read_only=True)
+    conn.execute(f"PRAGMA threads={DUCKDB_THREADS}")
+    conn.execute(f"PRAGMA memory_limit='{DUCKDB_MEMORY_LIMIT}'")
+    conn.execute("PRAGMA enable_object_cache")
 
     print("=" * 70)
     print("DEBATES DATENBANK - BEISPIEL-ABFRAGEN")
     print("=" * 70)
 
+    # Übersicht und Zeitraum in einer einzigen Abfrage
+    (debates_count, topics_count, speeches_count,
+     min_date, max_date) = conn.execute("""
+        SELECT
+            (SELECT COUNT(*) FROM debates),
+            (SELECT COUNT(*) FROM topics),
+            (SELECT COUNT(*) FROM speeches),
+            (SELECT MIN(date) FROM debates),
+            (SELECT MAX(date) FROM debates)
+    """).fetchone()
+
+    # Join speeches/debates einmalig materialisieren (nur benötigte Spalten),
+    # damit die folgenden Aggregationen speeches nicht erneut scannen
+    conn.execute("""
+        CREATE TEMP TABLE speeches_with_dates AS
+        SELECT
+            s.speaker_name,
+            s.debate_id,
+            d.date
+        FROM speeches s
+        JOIN debates d ON s.debate_id = d.debate_id
+    """)
+
     # 1. Übersicht
     print("\n1. DATENBANK-ÜBERSICHT")
     print("-" * 70)
 
-    debates_count = conn.execute("SELECT COUNT(*) FROM debates").fetchone()[0]
-    topics_count = conn.execute("SELECT COUNT(*) FROM topics").fetchone()[0]
-    speeches_count = conn.execute("SELECT COUNT(*) FROM speeches").fetchone()[0]
-
     print(f"Debatten:  {debates_count:,}")
     print(f"Themen:    {topics_count:,}")
     print(f"Reden:     {speeches_count:,}")
@@ -31,13 +59,8 @@ def main():
     print("\n2. ZEITRAUM")
     print("-" * 70)
 
-    date_range = conn.execute("""
-        SELECT MIN(date) as min_date, MAX(date) as max_date
-        FROM debates
-    """).fetchone()
-
-    print(f"Von: {date_range[0]}")
-    print(f"Bis: {date_range[1]}")
+    print(f"Von: {min_date}")
+    print(f"Bis: {max_date}")
 
     # 3. Top 10 Redner
     print("\n3. TOP 10 REDNER (nach Anzahl Reden)")
@@ -47,9 +70,8 @@ def main():
         SELECT
             speaker_name,
             COUNT(*) as speech_count,
-            COUNT(DISTINCT DATE_TRUNC('month', d.date)) as active_months
-        FROM speeches s
-        JOIN debates d ON s.debate_id = d.debate_id
+            COUNT(DISTINCT DATE_TRUNC('month', date)) as active_months
+        FROM speeches_with_dates
         WHERE speaker_name IS NOT NULL
         GROUP BY speaker_name
         ORDER BY speech_count DESC
@@ -65,11 +87,10 @@ def main():
 
     speeches_per_year = conn.execute("""
         SELECT
-            YEAR(d.date) as year,
+            YEAR(date) as year,
             COUNT(*) as speech_count,
-            COUNT(DISTINCT d.debate_id) as debate_count
-        FROM speeches s
-        JOIN debates d ON s.debate_id = d.debate_id
+            COUNT(DISTINCT debate_id) as debate_count
+        FROM speeches_with_dates
         GROUP BY year
         ORDER BY year
     """).fetchall()
@@ -120,20 +141,22 @@ def main():
     print("\n7. BEISPIEL EINER REDE")
     print("-" * 70)
 
+    # Erst filtern, dann ziehen: USING SAMPLE würde sonst vor dem WHERE greifen
     example_speech = conn.execute("""
-        SELECT
-            s.speaker_name,
-            d.date,
-            d.major_heading_text,
-            t.minor_heading_text,
-            LEFT(s.speech_text, 200) as speech_preview
-        FROM speeches s
-        JOIN debates d ON s.debate_id = d.debate_id
-        LEFT JOIN topics t ON s.topic_id = t.topic_id
-        WHERE s.speaker_name IS NOT NULL
-          AND LENGTH(s.speech_text) > 100
-        ORDER BY RANDOM()
-        LIMIT 1
+        SELECT * FROM (
+            SELECT
+                s.speaker_name,
+                d.date,
+                d.major_heading_text,
+                t.minor_heading_text,
+                LEFT(s.speech_text, 200) as speech_preview
+            FROM speeches s
+            JOIN debates d ON s.debate_id = d.debate_id
+            LEFT JOIN topics t ON s.topic_id = t.topic_id
+            WHERE s.speaker_name IS NOT NULL
+              AND LENGTH(s.speech_text) > 100
+        )
+        USING SAMPLE reservoir(1 ROWS)
     """).fetchone()
 
     if example_speech:
@@ -6,6 +6,7 @@ und erstellt eine neue Datenbank mit nur Brexit-relevanten Reden.
 """
 
 import duckdb
+import pyarrow as pa
 import re
 import os
 from pathlib import Path
@@ -29,32 +30,45 @@ OUTPUT_PRICE_PER_1M = 0.30  # $0.30 per 1M output tokens
 # Rate Limiting: 10 Requests/Minute für Gemini 2.5-flash
 REQUEST_DELAY = 6.0  # Sekunden zwischen API Calls
 
+# Keyword-Vorfilter: nur Reden mit mindestens einem Treffer gehen an Gemini
+PREFILTER_PATTERN = (
+    "brexit|article 50|european union|eu exit|withdrawal|backstop|"
+    "single market|customs union"
+)
+PREFILTER_REASONING = "keyword prefilter"
 
-def analyze_speech_with_gemini(speech_text, speaker_name, debate_name, date, api_key, retry_count=0):
-    """
-    Analysiert eine einzelne Rede mit Gemini auf Brexit-Bezug.
-    
-    Returns:
-        tuple: (has_brexit_relation: bool, confidence: float, reasoning: str, 
-                input_tokens: int, output_tokens: int)
-    """
-    if not api_key:
-        raise ValueError("GEMINI_API_KEY nicht gesetzt")
+# Reasoning-Präfixe fehlgeschlagener API Calls (werden nicht als klassifiziert markiert)
+API_ERROR_PREFIXES = ("API Error", "Rate Limit Error")
 
-    # Konfiguriere Gemini
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel(GEMINI_MODEL)
+# Anzahl Zeilen, die pro Arrow-Batch in Python-Objekte umgewandelt werden
+ARROW_BATCH_SIZE = 1000
+
+# Spaltenreihenfolge der Quell-Abfrage (entspricht dem Tuple-Unpacking in main)
+SPEECH_COLUMNS = [
+    "speech_id", "topic_id", "debate_id", "speaker_name", "person_id",
+    "speaker_office", "speech_type", "oral_qnum", "colnum", "time", "url",
+    "speech_text", "paragraph_count", "major_heading_text", "date",
+    "keyword_match"
+]
+
+# Spaltenreihenfolge der Output-Tabelle speeches
+OUTPUT_SPEECH_COLUMNS = SPEECH_COLUMNS[:13] + [
+    "brexit_related", "brexit_confidence", "brexit_reasoning"
+]
+
+# Maximale Anzahl Zeichen einer Rede im Prompt
+MAX_SPEECH_CHARS = 6000
 
-    # Erstelle Prompt
-    prompt = f"""You are analyzing a UK parliamentary House of Commons speech to determine if it relates to Brexit.
+# Prompt-Vorlage (statischer Teil wird nur einmal beim Import erstellt)
+_PROMPT_TEMPLATE = """You are analyzing a UK parliamentary House of Commons speech to determine if it relates to Brexit.
 
 **Speech Information:**
-- Speaker: {speaker_name}
-- Debate Topic: {debate_name}
+- Speaker: {speaker}
+- Debate Topic: {debate}
 - Date: {date}
 
 **Speech Text:**
-{speech_text[:6000]}
+{speech}
 
 **Task:**
 Analyze whether this speech has a significant relation to Brexit (the UK's withdrawal from the European Union).
@@ -76,6 +90,32 @@ Consider:
 
 Respond ONLY with the JSON object, no additional text."""
 
+
+def analyze_speech_with_gemini(speech_text, speaker_name, debate_name, date, api_key, retry_count=0):
+    """
+    Analysiert eine einzelne Rede mit Gemini auf Brexit-Bezug.
+    
+    Returns:
+        tuple: (has_brexit_relation: bool, confidence: float, reasoning: str, 
+                input_tokens: int, output_tokens: int)
+    """
+    if not api_key:
+        raise ValueError("GEMINI_API_KEY nicht gesetzt")
+
+    # Konfiguriere Gemini
+    genai.configure(api_key=api_key)
+    model = genai.GenerativeModel(GEMINI_MODEL)
+
+    # Erstelle Prompt (Rede nur kürzen, wenn sie länger als das Limit ist)
+    if len(speech_text) > MAX_SPEECH_CHARS:
+        speech_text = speech_text[:MAX_SPEECH_CHARS]
+    prompt = _PROMPT_TEMPLATE.format(
+        speaker=speaker_name,
+        debate=debate_name,
+        date=date,
+        speech=speech_text
+    )
+
     try:
         response = model.generate_content(prompt)
         response_text = response.text.strip()
@@ -118,20 +158,58 @@ Respond ONLY with the JSON object, no additional text."""
         return False, 0.0, f"API Error: {str(e)}", 0, 0
 
 
+def iter_speech_rows(speeches_table, batch_size=ARROW_BATCH_SIZE):
+    """
+    Iteriert zeilenweise über eine Arrow-Tabelle.
+    Python-Objekte werden nur für den jeweils aktuellen Batch erzeugt.
+    """
+    for batch in speeches_table.to_batches(max_chunksize=batch_size):
+        columns = [batch.column(name).to_pylist() for name in SPEECH_COLUMNS]
+        yield from zip(*columns)
+
+
+def new_speech_buffer():
+    """Erstellt einen spaltenweisen Puffer (eine Liste pro Output-Spalte)."""
+    return {name: [] for name in OUTPUT_SPEECH_COLUMNS}
+
+
+def flush_buffers(conn_out, speech_buffer, classified_ids):
+    """
+    Schreibt gepufferte Reden und Checkpoint-IDs als Arrow-Tabellen
+    in einer Transaktion in die Output-Datenbank und leert die Puffer.
+    """
+    conn_out.begin()
+    if speech_buffer["speech_id"]:
+        conn_out.register("speech_buffer", pa.table(speech_buffer))
+        conn_out.execute("INSERT INTO speeches SELECT * FROM speech_buffer")
+        conn_out.unregister("speech_buffer")
+    if classified_ids:
+        conn_out.register("classified_buffer", pa.table({"speech_id": classified_ids}))
+        conn_out.execute("INSERT INTO classified_speech_ids SELECT * FROM classified_buffer")
+        conn_out.unregister("classified_buffer")
+    conn_out.commit()
+
+    for values in speech_buffer.values():
+        values.clear()
+    classified_ids.clear()
+
+
 def setup_output_database():
-    """Erstellt die Output-Datenbank mit vereinfachtem Schema."""
-    print(f"Erstelle neue Output-Datenbank: {OUTPUT_DB}")
-    
-    # Lösche existierende Output-DB falls vorhanden
+    """
+    Öffnet (oder erstellt) die Output-Datenbank mit vereinfachtem Schema.
+    Eine bestehende Datenbank wird weiterverwendet, damit ein abgebrochener
+    Lauf (z.B. Kosten-Limit) fortgesetzt werden kann.
+    """
     if Path(OUTPUT_DB).exists():
-        Path(OUTPUT_DB).unlink()
-        print(f"  Alte Datenbank gelöscht")
+        print(f"Setze bestehende Output-Datenbank fort: {OUTPUT_DB}")
+    else:
+        print(f"Erstelle neue Output-Datenbank: {OUTPUT_DB}")
     
     conn_out = duckdb.connect(OUTPUT_DB)
     
     # Erstelle Tabellen mit vereinfachtem Schema
     conn_out.execute("""
-        CREATE TABLE debates (
+        CREATE TABLE IF NOT EXISTS debates (
             debate_id VARCHAR,
             date DATE,
             file_name VARCHAR,
@@ -143,7 +221,7 @@ def setup_output_database():
     """)
     
     conn_out.execute("""
-        CREATE TABLE topics (
+        CREATE TABLE IF NOT EXISTS topics (
             topic_id VARCHAR,
             debate_id VARCHAR,
             minor_heading_text VARCHAR,
@@ -154,7 +232,7 @@ def setup_output_database():
     """)
     
     conn_out.execute("""
-        CREATE TABLE speeches (
+        CREATE TABLE IF NOT EXISTS speeches (
             speech_id VARCHAR,
             topic_id VARCHAR,
             debate_id VARCHAR,
@@ -174,8 +252,20 @@ def setup_output_database():
         )
     """)
     
+    # Indizes für Lookups über debate_id/topic_id
+    conn_out.execute("CREATE INDEX IF NOT EXISTS idx_speeches_debate ON speeches(debate_id)")
+    conn_out.execute("CREATE INDEX IF NOT EXISTS idx_speeches_topic ON speeches(topic_id)")
+    conn_out.execute("CREATE INDEX IF NOT EXISTS idx_topics_debate ON topics(debate_id)")
+    
+    # Checkpoint: alle bereits klassifizierten Reden (Brexit und Non-Brexit)
+    conn_out.execute("""
+        CREATE TABLE IF NOT EXISTS classified_speech_ids (
+            speech_id VARCHAR PRIMARY KEY
+        )
+    """)
+    
     conn_out.commit()
-    print("  Tabellen erstellt")
+    print("  Tabellen bereit")
     
     return conn_out
 
@@ -239,8 +329,18 @@ def main():
     # Erstelle Output-Datenbank
     conn_out = setup_output_database()
 
-    # Hole alle Reden mit zugehörigen Informationen
-    speeches = conn_source.execute("""
+    # Quelldatenbank in die Output-Datenbank einhängen, damit bereits
+    # klassifizierte Reden direkt in DuckDB ausgefiltert werden
+    conn_out.execute(f"ATTACH '{DB_FILE}' AS src (READ_ONLY)")
+
+    already_classified = conn_out.execute(
+        "SELECT COUNT(*) FROM classified_speech_ids"
+    ).fetchone()[0]
+    if already_classified:
+        print(f"  {already_classified:,} Reden bereits klassifiziert, werden übersprungen")
+
+    # Hole alle noch nicht klassifizierten Reden (als Arrow-Tabelle)
+    speeches_table = conn_out.execute("""
         SELECT 
             s.speech_id,
             s.topic_id,
@@ -256,14 +356,16 @@ def main():
             s.speech_text,
             s.paragraph_count,
             d.major_heading_text,
-            d.date
-        FROM speeches s
-        JOIN debates d ON s.debate_id = d.debate_id
+            d.date,
+            regexp_matches(lower(s.speech_text), ?) AS keyword_match
+        FROM src.speeches s
+        JOIN src.debates d ON s.debate_id = d.debate_id
         WHERE s.speech_text IS NOT NULL
+          AND s.speech_id NOT IN (SELECT speech_id FROM classified_speech_ids)
         ORDER BY d.date, s.speech_id
-    """).fetchall()
+    """, [PREFILTER_PATTERN]).fetch_arrow_table()
 
-    total_speeches = len(speeches)
+    total_speeches = speeches_table.num_rows
     print(f"\nGefunden: {total_speeches:,} Reden zum Analysieren\n")
     print(f"💰 Kosten-Limit: ${COST_LIMIT:.2f}\n")
     print("Starte Klassifizierung...\n")
@@ -272,6 +374,8 @@ def main():
     total_processed = 0
     total_brexit_related = 0
     total_non_brexit = 0
+    total_prefiltered = 0
+    total_api_calls = 0
 
     # Cost Tracking
     total_input_tokens = 0
@@ -279,39 +383,50 @@ def main():
     total_cost = 0.0
     cost_limit_reached = False
 
-    # Tracking für kopierte Debates/Topics
-    copied_debates = set()
-    copied_topics = set()
+    # Tracking für kopierte Debates/Topics (inkl. vorheriger Läufe)
+    copied_debates = {row[0] for row in conn_out.execute("SELECT debate_id FROM debates").fetchall()}
+    copied_topics = {row[0] for row in conn_out.execute("SELECT topic_id FROM topics").fetchall()}
+
+    # Puffer für Bulk-Inserts (Reden werden mit ihren Checkpoints gemeinsam geschrieben)
+    speech_buffer = new_speech_buffer()
+    classified_ids = []
 
     last_api_call_time = 0
 
     # Verarbeite jede Rede
-    for i, speech_data in enumerate(speeches, 1):
+    for i, speech_data in enumerate(iter_speech_rows(speeches_table), 1):
         (speech_id, topic_id, debate_id, speaker_name, person_id, speaker_office,
          speech_type, oral_qnum, colnum, speech_time, url, speech_text, 
-         paragraph_count, debate_name, date) = speech_data
+         paragraph_count, debate_name, date, keyword_match) = speech_data
 
         if i % 10 == 0 or i == 1:
             print(f"[{i}/{total_speeches}] {date} - {speaker_name}")
 
-        # Rate Limiting
-        if last_api_call_time > 0:
-            time_since_last_call = time.time() - last_api_call_time
-            if time_since_last_call < REQUEST_DELAY:
-                wait_time = REQUEST_DELAY - time_since_last_call
-                if i % 10 == 0:
-                    print(f"  ⏱️  Rate Limit: Warte {wait_time:.1f}s...")
-                time.sleep(wait_time)
-
-        # Analysiere mit Gemini
-        last_api_call_time = time.time()
-        has_brexit_relation, confidence, reasoning, input_tokens, output_tokens = analyze_speech_with_gemini(
-            speech_text,
-            speaker_name or "Unknown",
-            debate_name or "Unknown Debate",
-            date,
-            api_key
-        )
+        if not keyword_match:
+            # Keyword-Vorfilter: ohne Brexit-Keyword kein API Call
+            has_brexit_relation, confidence, reasoning = False, 0.0, PREFILTER_REASONING
+            input_tokens, output_tokens = 0, 0
+            total_prefiltered += 1
+        else:
+            # Rate Limiting
+            if last_api_call_time > 0:
+                time_since_last_call = time.time() - last_api_call_time
+                if time_since_last_call < REQUEST_DELAY:
+                    wait_time = REQUEST_DELAY - time_since_last_call
+                    if i % 10 == 0:
+                        print(f"  ⏱️  Rate Limit: Warte {wait_time:.1f}s...")
+                    time.sleep(wait_time)
+
+            # Analysiere mit Gemini
+            last_api_call_time = time.time()
+            has_brexit_relation, confidence, reasoning, input_tokens, output_tokens = analyze_speech_with_gemini(
+                speech_text,
+                speaker_name or "Unknown",
+                debate_name or "Unknown Debate",
+                date,
+                api_key
+            )
+            total_api_calls += 1
 
         # Update Cost Tracking
         total_input_tokens += input_tokens
@@ -330,24 +445,24 @@ def main():
             # Kopiere Debate und Topics falls noch nicht kopiert
             copy_debate_and_topic_if_needed(conn_source, conn_out, debate_id, copied_debates, copied_topics)
             
-            # Füge Rede ein
-            conn_out.execute("""
-                INSERT INTO speeches VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, [
-                speech_id, topic_id, debate_id, speaker_name, person_id, speaker_office,
-                speech_type, oral_qnum, colnum, speech_time, url, speech_text, 
-                paragraph_count, has_brexit_relation, confidence, reasoning
-            ])
+            # Puffere Rede für den nächsten Bulk-Insert
+            row = speech_data[:13] + (has_brexit_relation, confidence, reasoning)
+            for name, value in zip(OUTPUT_SPEECH_COLUMNS, row):
+                speech_buffer[name].append(value)
             
             total_brexit_related += 1
         else:
             total_non_brexit += 1
 
+        # Checkpoint setzen (API-Fehler nicht, damit sie erneut versucht werden)
+        if not reasoning.startswith(API_ERROR_PREFIXES):
+            classified_ids.append(speech_id)
+
         total_processed += 1
 
-        # Commit alle 100 Reden
+        # Bulk-Insert alle 100 Reden
         if i % 100 == 0:
-            conn_out.commit()
+            flush_buffers(conn_out, speech_buffer, classified_ids)
             print(f"  💾 Zwischenspeicherung (Brexit: {total_brexit_related}, Non-Brexit: {total_non_brexit})")
 
         # Prüfe Kosten-Limit
@@ -359,7 +474,7 @@ def main():
             break
 
     # Finale Speicherung
-    conn_out.commit()
+    flush_buffers(conn_out, speech_buffer, classified_ids)
 
     # Zusammenfassung
     print("\n" + "=" * 70)
@@ -372,6 +487,7 @@ def main():
     print(f"  Reden analysiert:           {total_processed:,}")
     print(f"  Brexit-bezogen (behalten):  {total_brexit_related:,} ({total_brexit_related/max(total_processed,1)*100:.1f}%)")
     print(f"  Nicht Brexit (gelöscht):    {total_non_brexit:,} ({total_non_brexit/max(total_processed,1)*100:.1f}%)")
+    print(f"  Davon per Keyword-Filter:   {total_prefiltered:,}")
 
     # Datenbank-Statistiken
     saved_speeches = conn_out.execute("SELECT COUNT(*) FROM speeches").fetchone()[0]
@@ -385,7 +501,7 @@ def main():
 
     # Kosten-Zusammenfassung
     print(f"\n💰 Kosten-Übersicht:")
-    print(f"  API Calls:                  {total_processed:,}")
+    print(f"  API Calls:                  {total_api_calls:,}")
     print(f"  Input Tokens:               {total_input_tokens:,}")
     print(f"  Output Tokens:              {total_output_tokens:,}")
     print(f"  Gesamtkosten:               ${total_cost:.2f}")
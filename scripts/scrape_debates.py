@@ -4,49 +4,74 @@ Scraper für TheyWorkForYou XML-Dateien
 Lädt pro Datum nur die Datei mit dem letzten Buchstaben im Alphabet herunter
 """
 
+import asyncio
+import aiofiles
+import aiohttp
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from pathlib import Path
-from collections import defaultdict
+import json
+import os
 import re
-from concurrent.futures import ThreadPoolExecutor, as_completed
 
 BASE_URL = "https://www.theyworkforyou.com/pwdata/scrapedxml/debates/"
 DATA_DIR = Path("../data/raw")
 YEAR_START = 2012
 YEAR_END = 2022
-MAX_WORKERS = 10  # Anzahl paralleler Downloads
+MAX_WORKERS = 32  # Anzahl paralleler Downloads (gleichzeitige Verbindungen)
+USER_AGENT = "data_collection-scraper/1.0"
+DOWNLOAD_CHUNK_SIZE = 64 * 1024  # Bytes pro Schreibvorgang beim Streaming
+DNS_CACHE_TTL = 300  # Sekunden
+MANIFEST_FILE = ".manifest.json"  # ETag/Last-Modified/Größe je Datei im DATA_DIR
 
+# Retries bei Rate Limit / Serverfehlern
+RETRY_TOTAL = 3
+RETRY_BACKOFF = 0.5  # Sekunden, verdoppelt sich pro Versuch
+RETRY_STATUS = (429, 500, 502, 503, 504)
 
-def get_file_list():
+
+def create_session():
+    """
+    Erstellt eine requests.Session mit Keep-Alive-Connection-Pool
+    und automatischen Retries (für synchrone Requests wie die Dateiliste)
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=MAX_WORKERS,
+        pool_maxsize=MAX_WORKERS,
+        max_retries=Retry(
+            total=RETRY_TOTAL,
+            backoff_factor=RETRY_BACKOFF,
+            status_forcelist=RETRY_STATUS
+        )
+    )
+    session.mount("https://", adapter)
+    session.headers["User-Agent"] = USER_AGENT
+    return session
+
+
+# Gemeinsame Session für alle Requests (thread-safe für GET)
+SESSION = create_session()
+
+
+# Links auf Debatten-XML-Dateien im Apache-Verzeichnisindex
+_HREF_RE = re.compile(r'href="(debates\d{4}-\d{2}-\d{2}[a-z]\.xml)"')
+
+
+def get_file_list(session=SESSION):
     """Holt die Liste aller verfügbaren XML-Dateien von der Website"""
     print(f"Lade Dateiliste von {BASE_URL}...")
-    response = requests.get(BASE_URL)
+    response = session.get(BASE_URL, timeout=30)
     response.raise_for_status()
 
-    soup = BeautifulSoup(response.text, 'html.parser')
+    # Finde alle Links zu XML-Dateien direkt im HTML (kein DOM-Aufbau nötig)
+    return _HREF_RE.findall(response.text)
 
-    # Finde alle Links zu XML-Dateien
-    xml_files = []
-    for link in soup.find_all('a'):
-        href = link.get('href')
-        if href and href.endswith('.xml') and 'debates' in href:
-            xml_files.append(href)
 
-    return xml_files
-
-
-def parse_filename(filename):
-    """
-    Extrahiert Datum und Suffix-Buchstaben aus dem Dateinamen
-    Beispiel: debates2008-06-16c.xml -> ('2008-06-16', 'c')
-    """
-    match = re.match(r'debates(\d{4}-\d{2}-\d{2})([a-z])\.xml', filename)
-    if match:
-        date = match.group(1)
-        letter = match.group(2)
-        return date, letter
-    return None, None
+# Dateiname -> (Datum, Jahr, Suffix-Buchstabe)
+# Beispiel: debates2008-06-16c.xml -> ('2008-06-16', '2008', 'c')
+_FILENAME_RE = re.compile(r'debates((\d{4})-\d{2}-\d{2})([a-z])\.xml')
 
 
 def filter_latest_per_date(file_list):
@@ -55,47 +80,153 @@ def filter_latest_per_date(file_list):
     mit dem letzten Buchstaben im Alphabet zurückgegeben wird
     Berücksichtigt nur Jahre von YEAR_START bis YEAR_END (einschließlich)
     """
-    # Gruppiere Dateien nach Datum
-    files_by_date = defaultdict(list)
+    # Jahre als Strings vergleichen (vierstellig, daher gleiche Ordnung wie int)
+    year_start = str(YEAR_START)
+    year_end = str(YEAR_END)
 
+    # Ein Durchlauf: pro Datum nur die Datei mit dem bisher größten Buchstaben merken
+    latest_per_date = {}
     for filename in file_list:
-        date, letter = parse_filename(filename)
-        if date and letter:
-            # Prüfe Jahreszeitraum
-            year = int(date.split('-')[0])
-            if YEAR_START <= year <= YEAR_END:
-                files_by_date[date].append((letter, filename))
-
-    # Wähle pro Datum die Datei mit dem letzten Buchstaben
-    filtered_files = []
-    for date, files in files_by_date.items():
-        # Sortiere nach Buchstabe und nimm den letzten
-        files.sort(key=lambda x: x[0])
-        last_file = files[-1][1]
-        filtered_files.append(last_file)
-
-    return sorted(filtered_files)
-
-
-def download_file(filename, output_dir):
-    """Lädt eine einzelne XML-Datei herunter"""
+        match = _FILENAME_RE.match(filename)
+        if not match:
+            continue
+        date, year, letter = match.groups()
+        if year_start <= year <= year_end:
+            current = latest_per_date.get(date)
+            if current is None or letter > current[0]:
+                latest_per_date[date] = (letter, filename)
+
+    return sorted(filename for _, filename in latest_per_date.values())
+
+
+def load_manifest(output_dir):
+    """Lädt das Download-Manifest (Dateiname -> ETag, Last-Modified, Größe)"""
+    manifest_path = output_dir / MANIFEST_FILE
+    if not manifest_path.exists():
+        return {}
+    try:
+        return json.loads(manifest_path.read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(output_dir, manifest):
+    """Schreibt das Download-Manifest (atomar über eine .part-Datei)"""
+    manifest_path = output_dir / MANIFEST_FILE
+    part_path = manifest_path.with_suffix('.json.part')
+    part_path.write_text(json.dumps(manifest, indent=2, sort_keys=True))
+    os.replace(part_path, manifest_path)
+
+
+def conditional_headers(entry):
+    """Baut If-None-Match/If-Modified-Since Header aus einem Manifest-Eintrag"""
+    headers = {}
+    if entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+    return headers
+
+
+async def download_file(session, filename, output_dir, manifest):
+    """
+    Lädt eine einzelne XML-Datei herunter (asynchron)
+    Bereits vorhandene Dateien mit Manifest-Eintrag werden per
+    Conditional Request geprüft und bei 304 nicht erneut geladen
+    """
     url = BASE_URL + filename
     output_path = output_dir / filename
+    entry = manifest.get(filename)
 
-    # Überspringe, falls Datei bereits existiert
+    headers = {}
     if output_path.exists():
-        return (filename, True, "bereits vorhanden")
+        # Ohne Manifest-Eintrag (ältere Läufe) wie bisher überspringen
+        if entry is None:
+            return (filename, True, "bereits vorhanden")
+        # Bei abweichender Größe komplett neu laden
+        if entry.get("size") == output_path.stat().st_size:
+            headers = conditional_headers(entry)
+            if not headers:
+                return (filename, True, "bereits vorhanden")
 
+    # In eine .part-Datei streamen und erst nach Abschluss umbenennen,
+    # damit abgebrochene Downloads nicht als "bereits vorhanden" gelten
+    part_path = output_path.with_suffix('.xml.part')
     try:
-        response = requests.get(url, timeout=30)
-        response.raise_for_status()
+        for attempt in range(RETRY_TOTAL + 1):
+            async with session.get(url, headers=headers) as response:
+                if response.status == 304:
+                    return (filename, True, "unverändert")
+                if response.status in RETRY_STATUS and attempt < RETRY_TOTAL:
+                    await asyncio.sleep(RETRY_BACKOFF * (2 ** attempt))
+                    continue
+                response.raise_for_status()
+                size = 0
+                async with aiofiles.open(part_path, 'wb') as f:
+                    async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                        await f.write(chunk)
+                        size += len(chunk)
+                response_headers = response.headers
+            break
 
-        output_path.write_bytes(response.content)
+        os.replace(part_path, output_path)
+        manifest[filename] = {
+            "etag": response_headers.get("ETag"),
+            "last_modified": response_headers.get("Last-Modified"),
+            "size": size
+        }
         return (filename, True, "heruntergeladen")
     except Exception as e:
+        part_path.unlink(missing_ok=True)
         return (filename, False, str(e))
 
 
+async def download_all(files_to_download):
+    """
+    Lädt alle Dateien über eine gemeinsame aiohttp-Session herunter
+    Gibt (heruntergeladen, übersprungen, fehler) zurück
+    """
+    success_count = 0
+    skipped_count = 0
+    error_count = 0
+
+    # Manifest wird im Event-Loop geteilt und am Ende einmal geschrieben
+    manifest = load_manifest(DATA_DIR)
+
+    connector = aiohttp.TCPConnector(limit=MAX_WORKERS, ttl_dns_cache=DNS_CACHE_TTL)
+    timeout = aiohttp.ClientTimeout(sock_connect=30, sock_read=30)
+
+    async with aiohttp.ClientSession(
+        connector=connector,
+        timeout=timeout,
+        headers={"User-Agent": USER_AGENT}
+    ) as session:
+        # Starte alle Downloads
+        downloads = [
+            download_file(session, filename, DATA_DIR, manifest)
+            for filename in files_to_download
+        ]
+
+        # Sammle Ergebnisse
+        for i, download in enumerate(asyncio.as_completed(downloads), 1):
+            filename, success, message = await download
+
+            if success:
+                if message == "heruntergeladen":
+                    success_count += 1
+                    print(f"[{i}/{len(files_to_download)}] ✓ {filename}")
+                else:
+                    skipped_count += 1
+                    print(f"[{i}/{len(files_to_download)}] ⊘ {filename} ({message})")
+            else:
+                error_count += 1
+                print(f"[{i}/{len(files_to_download)}] ✗ {filename} - Fehler: {message}")
+
+    save_manifest(DATA_DIR, manifest)
+
+    return success_count, skipped_count, error_count
+
+
 def main():
     """Hauptfunktion des Scrapers"""
     print("TheyWorkForYou XML Debates Scraper")
@@ -115,32 +246,8 @@ def main():
     print(f"Nach Filterung: {len(files_to_download)} Dateien zum Download\n")
 
     # Lade Dateien herunter (parallel)
-    print(f"Starte Downloads ({MAX_WORKERS} parallele Threads)...\n")
-    success_count = 0
-    skipped_count = 0
-    error_count = 0
-
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        # Starte alle Downloads
-        future_to_file = {
-            executor.submit(download_file, filename, DATA_DIR): filename
-            for filename in files_to_download
-        }
-
-        # Sammle Ergebnisse
-        for i, future in enumerate(as_completed(future_to_file), 1):
-            filename, success, message = future.result()
-
-            if success:
-                if message == "heruntergeladen":
-                    success_count += 1
-                    print(f"[{i}/{len(files_to_download)}] ✓ {filename}")
-                else:
-                    skipped_count += 1
-                    print(f"[{i}/{len(files_to_download)}] ⊘ {filename} (bereits vorhanden)")
-            else:
-                error_count += 1
-                print(f"[{i}/{len(files_to_download)}] ✗ {filename} - Fehler: {message}")
+    print(f"Starte Downloads ({MAX_WORKERS} parallele Verbindungen)...\n")
+    success_count, skipped_count, error_count = asyncio.run(download_all(files_to_download))
 
     # Zusammenfassung
     print("\n" + "=" * 50)
@@ -6,7 +6,7 @@ echo "Starting Railway deployment..."
 echo "Checking for streamlit..."
 /opt/venv/bin/python -c "import streamlit" 2>/dev/null || {
     echo "Streamlit not found, installing..."
-    /opt/venv/bin/pip install streamlit==1.50.0 plotly==6.3.1 pandas==2.3.3
+    /opt/venv/bin/pip install streamlit==1.50.0 pandas==2.3.3
 }
 
 # Activate virtual environment
@@ -5,8 +5,15 @@ Testet nur Januar 2016 Debatten
 """
 
 import duckdb
+import hashlib
+import pyarrow as pa
 import re
 import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import google.generativeai as genai
 from dotenv import load_dotenv
@@ -19,6 +26,34 @@ DB_FILE = "../data/processed/debates.duckdb"
 OUTPUT_DB = "../data/processed/debates_brexit_test_jan2016.duckdb"
 GEMINI_MODEL = "gemini-2.0-flash-exp"
 
+# Obergrenze für die Antwortlänge: das erwartete JSON braucht weit unter 100 Tokens,
+# ausschweifende Antworten werden so nicht mehr voll generiert (und bezahlt)
+GEMINI_MAX_OUTPUT_TOKENS = 256
+
+# Strukturierte Ausgabe: Gemini liefert garantiert genau dieses JSON-Objekt
+GEMINI_RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "has_brexit_relation": {"type": "boolean"},
+        "confidence": {"type": "number"},
+        "reasoning": {"type": "string"}
+    },
+    "required": ["has_brexit_relation", "confidence", "reasoning"]
+}
+
+# Maximale Anzahl gleichzeitig laufender Gemini-Anfragen (das Rate Limit gilt für den Start)
+GEMINI_CONCURRENCY = 4
+
+# Rate Limiting: höchstens 10 Gemini-Aufrufe im rollierenden 60-Sekunden-Fenster
+GEMINI_REQUESTS_PER_MINUTE = 10
+GEMINI_RATE_LIMIT_WINDOW = 60.0  # Sekunden
+
+# Persistenter Cache für Gemini-Antworten (überlebt das Neuerstellen der Test-Datenbank)
+LLM_CACHE_DB = "../data/processed/gemini_cache.duckdb"
+
+# Reasoning-Präfixe fehlgeschlagener API Calls (werden nicht gecacht)
+LLM_ERROR_PREFIXES = ("API Error", "Rate Limit Error", "Failed to parse response")
+
 
 # Brexit-Keywords mit Gewichtung
 DIRECT_KEYWORDS = [
@@ -42,6 +77,28 @@ INDIRECT_KEYWORDS = [
     "northern ireland protocol", "backstop", "irish border"
 ]
 
+# Alle Keywords in einer Regex: ein Durchlauf über den Text statt einer Suche pro Keyword.
+# Der Lookahead findet auch überlappende Treffer, längere Keywords haben Vorrang.
+_KEYWORD_RE = re.compile(
+    r'(?=\b('
+    + '|'.join(re.escape(k) for k in sorted(DIRECT_KEYWORDS + INDIRECT_KEYWORDS, key=len, reverse=True))
+    + r')\b)'
+)
+
+# Dieselbe Alternation für DuckDB (RE2): Vorfilter, welche Debatten überhaupt Keywords enthalten
+KEYWORD_SQL_PATTERN = (
+    r'\b(' + '|'.join(re.escape(k) for k in DIRECT_KEYWORDS + INDIRECT_KEYWORDS) + r')\b'
+)
+
+# Kürzere Keywords, die Präfix eines längeren Treffers sind, zählen an derselben Stelle mit
+_KEYWORD_PREFIXES = {
+    keyword: [
+        other for other in DIRECT_KEYWORDS + INDIRECT_KEYWORDS
+        if other != keyword and keyword.startswith(other) and not keyword[len(other)].isalnum()
+    ]
+    for keyword in DIRECT_KEYWORDS + INDIRECT_KEYWORDS
+}
+
 
 def analyze_keywords(text):
     """
@@ -53,16 +110,15 @@ def analyze_keywords(text):
 
     text_lower = text.lower()
 
-    found_direct = []
-    found_indirect = []
-
-    for keyword in DIRECT_KEYWORDS:
-        if re.search(r'\b' + re.escape(keyword) + r'\b', text_lower):
-            found_direct.append(keyword)
+    found = set()
+    for match in _KEYWORD_RE.finditer(text_lower):
+        keyword = match.group(1)
+        found.add(keyword)
+        found.update(_KEYWORD_PREFIXES[keyword])
 
-    for keyword in INDIRECT_KEYWORDS:
-        if re.search(r'\b' + re.escape(keyword) + r'\b', text_lower):
-            found_indirect.append(keyword)
+    # Reihenfolge wie in den Keyword-Listen
+    found_direct = [keyword for keyword in DIRECT_KEYWORDS if keyword in found]
+    found_indirect = [keyword for keyword in INDIRECT_KEYWORDS if keyword in found]
 
     # Berechne Confidence Score
     direct_score = min(len(found_direct) * 0.3, 0.7)
@@ -74,18 +130,49 @@ def analyze_keywords(text):
     return confidence, all_found
 
 
+# Gemeinsames Gemini-Modell (wird beim ersten Aufruf einmal erstellt)
+_gemini_model = None
+_gemini_model_lock = threading.Lock()
+
+
+def get_gemini_model(api_key):
+    """Konfiguriert Gemini einmalig und gibt das gemeinsame Modell zurück (thread-sicher)"""
+    global _gemini_model
+    with _gemini_model_lock:
+        if _gemini_model is None:
+            genai.configure(api_key=api_key)
+            _gemini_model = genai.GenerativeModel(GEMINI_MODEL)
+    return _gemini_model
+
+
+# Startzeitpunkte der letzten Gemini-Aufrufe (von allen Worker-Threads geteilt)
+_gemini_call_times = deque(maxlen=GEMINI_REQUESTS_PER_MINUTE)
+_gemini_rate_lock = threading.Lock()
+
+
+def wait_for_gemini_slot():
+    """
+    Wartet, bis im rollierenden Fenster ein Gemini-Aufruf frei ist, und
+    vermerkt den Start (thread-sicher, gilt auch für Retries)
+    """
+    with _gemini_rate_lock:
+        if len(_gemini_call_times) == GEMINI_REQUESTS_PER_MINUTE:
+            wait_time = GEMINI_RATE_LIMIT_WINDOW - (time.time() - _gemini_call_times[0])
+            if wait_time > 0:
+                print(f"  ⏱️  Rate Limit: Warte {wait_time:.1f}s...")
+                time.sleep(wait_time)
+        _gemini_call_times.append(time.time())
+
+
 def analyze_with_gemini(debate_name, date, speeches_text, keywords_found, api_key, retry_count=0):
     """
     Schritt 2: LLM-basierte Analyse mit Gemini
     Gibt (has_brexit_relation: bool, confidence: float, reasoning: str, input_tokens: int, output_tokens: int) zurück
     """
-    import time
-
     if not api_key:
         raise ValueError("GEMINI_API_KEY nicht gesetzt")
 
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel(GEMINI_MODEL)
+    model = get_gemini_model(api_key)
 
     prompt = f"""You are analyzing UK parliamentary debates to determine if they relate to Brexit.
 
@@ -116,7 +203,15 @@ Consider:
 Respond ONLY with the JSON object, no additional text."""
 
     try:
-        response = model.generate_content(prompt)
+        wait_for_gemini_slot()
+        response = model.generate_content(
+            prompt,
+            generation_config={
+                "max_output_tokens": GEMINI_MAX_OUTPUT_TOKENS,
+                "response_mime_type": "application/json",
+                "response_schema": GEMINI_RESPONSE_SCHEMA
+            }
+        )
         response_text = response.text.strip()
 
         # Token-Zählung aus Response-Metadaten
@@ -124,20 +219,21 @@ Respond ONLY with the JSON object, no additional text."""
         output_tokens = response.usage_metadata.candidates_token_count if hasattr(response, 'usage_metadata') else 0
 
         import json
-        json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-        if json_match:
-            result = json.loads(json_match.group())
-            return (
-                result.get('has_brexit_relation', False),
-                float(result.get('confidence', 0.0)),
-                result.get('reasoning', ''),
-                input_tokens,
-                output_tokens
-            )
-        else:
+        try:
+            result = json.loads(response_text)
+        except json.JSONDecodeError:
+            # Nur noch bei abgeschnittenen Antworten (max_output_tokens) möglich
             print(f"  ⚠ Konnte JSON nicht parsen: {response_text[:100]}")
             return False, 0.0, "Failed to parse response", input_tokens, output_tokens
 
+        return (
+            result.get('has_brexit_relation', False),
+            float(result.get('confidence', 0.0)),
+            result.get('reasoning', ''),
+            input_tokens,
+            output_tokens
+        )
+
     except Exception as e:
         error_str = str(e)
 
@@ -157,6 +253,44 @@ Respond ONLY with the JSON object, no additional text."""
         return False, 0.0, f"API Error: {str(e)}", 0, 0
 
 
+def open_llm_cache():
+    """Öffnet (oder erstellt) den persistenten Cache für Gemini-Antworten"""
+    conn_cache = duckdb.connect(LLM_CACHE_DB)
+    conn_cache.execute("""
+        CREATE TABLE IF NOT EXISTS llm_cache (
+            cache_key VARCHAR PRIMARY KEY,
+            has_brexit_relation BOOLEAN,
+            confidence DOUBLE,
+            reasoning VARCHAR,
+            input_tokens INTEGER,
+            output_tokens INTEGER
+        )
+    """)
+    return conn_cache
+
+
+def llm_cache_key(debate_name, date, speeches_text, keywords_found):
+    """Deterministischer Schlüssel über alle Eingaben, die in den Gemini-Prompt einfließen"""
+    payload = "|".join([
+        GEMINI_MODEL,
+        str(debate_name),
+        str(date),
+        speeches_text[:8000],
+        ', '.join(keywords_found[:10])
+    ])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def emit_log(log):
+    """
+    Schreibt die gesammelten Ausgabezeilen einer Debatte mit einem einzigen
+    Schreibvorgang nach stdout (statt eines print() pro Zeile) und leert den Puffer.
+    """
+    if log:
+        sys.stdout.write("\n".join(log) + "\n")
+        log.clear()
+
+
 def combine_results(keyword_confidence, keyword_count, llm_has_relation, llm_confidence):
     """
     Schritt 3: Kombiniere Keyword- und LLM-Ergebnisse
@@ -171,6 +305,44 @@ def combine_results(keyword_confidence, keyword_count, llm_has_relation, llm_con
     return has_brexit_relation, combined_confidence
 
 
+def new_update_buffer():
+    """Erstellt einen spaltenweisen Puffer für die Klassifizierungsergebnisse pro Debatte."""
+    return {
+        "debate_id": [],
+        "brexit_related": [],
+        "brexit_confidence": [],
+        "brexit_keyword_confidence": [],
+        "brexit_llm_confidence": [],
+        "brexit_keywords_found": [],
+        "brexit_llm_reasoning": [],
+    }
+
+
+def apply_debate_updates(conn_out, update_buffer):
+    """
+    Überträgt alle gepufferten Debatten-Ergebnisse mit einem einzigen
+    UPDATE ... FROM auf die Reden (statt eines UPDATEs pro Debatte).
+    """
+    if not update_buffer["debate_id"]:
+        return
+
+    conn_out.register("debate_updates", pa.table(update_buffer))
+    conn_out.execute("""
+        UPDATE speeches
+        SET
+            brexit_related = u.brexit_related,
+            brexit_confidence = u.brexit_confidence,
+            brexit_keyword_confidence = u.brexit_keyword_confidence,
+            brexit_llm_confidence = u.brexit_llm_confidence,
+            brexit_keywords_found = u.brexit_keywords_found,
+            brexit_llm_reasoning = u.brexit_llm_reasoning
+        FROM debate_updates u
+        WHERE speeches.debate_id = u.debate_id
+    """)
+    conn_out.unregister("debate_updates")
+    conn_out.commit()
+
+
 def setup_output_database(source_db_path):
     """Erstellt eine Kopie der Datenbank mit zusätzlichen Brexit-Spalten"""
     print(f"Erstelle Test-Datenbank: {OUTPUT_DB}")
@@ -193,25 +365,28 @@ def setup_output_database(source_db_path):
     conn_out.execute("""
         CREATE TABLE topics AS
         SELECT t.* FROM source_db.topics t
-        JOIN debates d ON t.debate_id = d.debate_id
+        SEMI JOIN debates d ON t.debate_id = d.debate_id
     """)
 
-    print("  Kopiere Januar 2016 speeches...")
+    # Brexit-Klassifizierungsspalten werden direkt beim Kopieren mit angelegt.
+    # Sortiert nach debate_id, damit die Zonemaps (Min/Max je Row-Group) beim
+    # abschließenden UPDATE ... FROM nur die betroffenen Row-Groups treffen.
+    print("  Kopiere Januar 2016 speeches (mit Brexit-Klassifizierungsspalten)...")
     conn_out.execute("""
         CREATE TABLE speeches AS
-        SELECT s.* FROM source_db.speeches s
-        JOIN debates d ON s.debate_id = d.debate_id
+        SELECT
+            s.*,
+            FALSE AS brexit_related,
+            0.0::FLOAT AS brexit_confidence,
+            0.0::FLOAT AS brexit_keyword_confidence,
+            0.0::FLOAT AS brexit_llm_confidence,
+            NULL::VARCHAR AS brexit_keywords_found,
+            NULL::VARCHAR AS brexit_llm_reasoning
+        FROM source_db.speeches s
+        SEMI JOIN debates d ON s.debate_id = d.debate_id
+        ORDER BY s.debate_id, s.speech_id
     """)
 
-    # Füge Brexit-Spalten hinzu
-    print("  Füge Brexit-Klassifizierungsspalten hinzu...")
-    conn_out.execute("ALTER TABLE speeches ADD COLUMN brexit_related BOOLEAN DEFAULT FALSE")
-    conn_out.execute("ALTER TABLE speeches ADD COLUMN brexit_confidence FLOAT DEFAULT 0.0")
-    conn_out.execute("ALTER TABLE speeches ADD COLUMN brexit_keyword_confidence FLOAT DEFAULT 0.0")
-    conn_out.execute("ALTER TABLE speeches ADD COLUMN brexit_llm_confidence FLOAT DEFAULT 0.0")
-    conn_out.execute("ALTER TABLE speeches ADD COLUMN brexit_keywords_found VARCHAR")
-    conn_out.execute("ALTER TABLE speeches ADD COLUMN brexit_llm_reasoning VARCHAR")
-
     conn_out.commit()
     return conn_out
 
@@ -237,22 +412,49 @@ def main():
         print(f"✗ Datenbank {DB_FILE} nicht gefunden!")
         return
 
-    conn_source = duckdb.connect(DB_FILE, read_only=True)
-
-    # Erstelle Output-Datenbank
+    # Erstelle Output-Datenbank (enthält bereits nur Januar 2016, die Quelle
+    # bleibt als source_db angehängt)
     conn_out = setup_output_database(DB_FILE)
 
-    # Hole alle Debatten aus Januar 2016
-    debates = conn_source.execute("""
-        SELECT DISTINCT
+    # Gemini-Antworten früherer Läufe
+    conn_cache = open_llm_cache()
+
+    # Hole alle Debatten aus Januar 2016; der Keyword-Vorfilter läuft vektorisiert
+    # in DuckDB, Python analysiert danach nur noch Debatten mit Treffer
+    debates = conn_out.execute("""
+        SELECT
             d.debate_id,
             d.date,
-            d.major_heading_text
+            d.major_heading_text,
+            COUNT(s.speech_id) > 0 AS has_speeches,
+            COALESCE(bool_or(regexp_matches(lower(s.speech_text), ?)), FALSE) AS keyword_match
         FROM debates d
+        LEFT JOIN speeches s
+            ON s.debate_id = d.debate_id
+           AND s.speech_text IS NOT NULL
         WHERE d.date >= '2016-01-01' AND d.date < '2016-02-01'
           AND d.major_heading_text IS NOT NULL
+        GROUP BY d.debate_id, d.date, d.major_heading_text
         ORDER BY d.date, d.debate_id
-    """).fetchall()
+    """, [KEYWORD_SQL_PATTERN]).fetchall()
+
+    # Die ersten 5 Redebeiträge jeder Debatte mit einer Abfrage statt einer pro Debatte
+    first_speeches = {}
+    for debate_id, speech_text in conn_out.execute("""
+        SELECT debate_id, speech_text
+        FROM (
+            SELECT
+                debate_id,
+                speech_id,
+                speech_text,
+                row_number() OVER (PARTITION BY debate_id ORDER BY speech_id) AS rn
+            FROM speeches
+            WHERE speech_text IS NOT NULL
+        )
+        WHERE rn <= 5
+        ORDER BY debate_id, speech_id
+    """).fetchall():
+        first_speeches.setdefault(debate_id, []).append(speech_text)
 
     print(f"\nGefunden: {len(debates)} Debatten in Januar 2016\n")
     print("Starte Klassifizierung...\n")
@@ -270,45 +472,60 @@ def main():
     total_output_tokens = 0
     total_api_calls = 0
 
+    # Tokens aller LLM-Analysen inkl. Cache-Treffern (nur für die Hochrechnung,
+    # abgerechnet werden nur die Tokens der tatsächlichen API Calls)
+    sample_input_tokens = 0
+    sample_output_tokens = 0
+
     # Zeit-Tracking
-    import time
     start_time = time.time()
 
-    # Rate Limiting: 10 Requests/Minute
-    # Warte 6 Sekunden zwischen API Calls (=10 Requests/Minute)
-    REQUEST_DELAY = 6.0  # Sekunden
-
     # Detaillierte Ergebnisse sammeln
     results = []
-    last_api_call_time = 0
+    update_buffer = new_update_buffer()
+
+    # Gemini-Anfragen laufen parallel im Hintergrund; die Antworten werden
+    # nach der Schleife in Debatten-Reihenfolge eingesammelt
+    gemini_executor = ThreadPoolExecutor(max_workers=GEMINI_CONCURRENCY)
+    pending = []
 
     # Verarbeite jede Debatte
-    for i, (debate_id, date, debate_name) in enumerate(debates, 1):
-        print(f"[{i}/{len(debates)}] {date} - {debate_name[:60]}")
+    for i, (debate_id, date, debate_name, has_speeches, keyword_match) in enumerate(debates, 1):
+        # Ausgaben pro Debatte puffern und am Ende der Iteration einmal schreiben
+        log = [f"[{i}/{len(debates)}] {date} - {debate_name[:60]}"]
 
-        # Hole ersten 5 Redebeiträge
-        speeches = conn_source.execute("""
-            SELECT speech_id, speech_text
-            FROM speeches
-            WHERE debate_id = ?
-            AND speech_text IS NOT NULL
-            ORDER BY speech_id
-            LIMIT 5
-        """, [debate_id]).fetchall()
-
-        if not speeches:
-            print("  → Keine Reden gefunden, überspringe\n")
+        if not has_speeches:
+            log.append("  → Keine Reden gefunden, überspringe\n")
+            emit_log(log)
             continue
 
-        # Kombiniere Texte
-        combined_text = "\n\n".join([s[1] for s in speeches])
+        # Kein Keyword in irgendeiner Rede der Debatte: Reden nicht erst laden
+        if not keyword_match:
+            log.append("  Keywords: 0 gefunden, Confidence: 0.00")
+            total_processed += 1
+            results.append({
+                'date': date,
+                'debate': debate_name[:50],
+                'keywords': 0,
+                'keyword_conf': 0.0,
+                'llm_conf': 0.0,
+                'final': False,
+                'final_conf': 0.0,
+                'reasoning': 'No keywords found'
+            })
+            log.append("")
+            emit_log(log)
+            continue
+
+        # Kombiniere die ersten 5 Redebeiträge
+        combined_text = "\n\n".join(first_speeches[debate_id])
 
         # SCHRITT 1: Keyword-Analyse
         keyword_conf, keywords_found = analyze_keywords(combined_text)
 
-        print(f"  Keywords: {len(keywords_found)} gefunden, Confidence: {keyword_conf:.2f}")
+        log.append(f"  Keywords: {len(keywords_found)} gefunden, Confidence: {keyword_conf:.2f}")
         if keywords_found:
-            print(f"    → {', '.join(keywords_found[:5])}")
+            log.append(f"    → {', '.join(keywords_found[:5])}")
 
         # Wenn keine Keywords gefunden, überspringe
         if len(keywords_found) == 0:
@@ -323,38 +540,93 @@ def main():
                 'final_conf': 0.0,
                 'reasoning': 'No keywords found'
             })
-            print()
+            log.append("")
+            emit_log(log)
             continue
 
         total_with_keywords += 1
 
-        # Rate Limiting: Warte 6 Sekunden zwischen API Calls
-        if last_api_call_time > 0:
-            time_since_last_call = time.time() - last_api_call_time
-            if time_since_last_call < REQUEST_DELAY:
-                wait_time = REQUEST_DELAY - time_since_last_call
-                print(f"  ⏱️  Rate Limit: Warte {wait_time:.1f}s...")
-                time.sleep(wait_time)
+        # Ergebnis-Eintrag in Debatten-Reihenfolge anlegen; die LLM-Felder
+        # werden ergänzt, sobald die Gemini-Antwort vorliegt
+        result = {
+            'date': date,
+            'debate': debate_name[:50],
+            'keywords': len(keywords_found),
+            'keyword_conf': keyword_conf
+        }
+        results.append(result)
+
+        # SCHRITT 2: LLM-Analyse (bei Cache-Treffer ohne API Call und ohne Wartezeit)
+        cache_key = llm_cache_key(debate_name, date, combined_text, keywords_found)
+        cached = conn_cache.execute("""
+            SELECT has_brexit_relation, confidence, reasoning, input_tokens, output_tokens
+            FROM llm_cache
+            WHERE cache_key = ?
+        """, [cache_key]).fetchone()
+
+        llm_call = None
+        if cached:
+            log.append("  Gemini-Ergebnis aus Cache")
+        else:
+            # Das Rate Limit greift im Worker direkt vor dem eigentlichen API Call
+            log.append("  Gemini-Anfrage eingereiht...")
+            llm_call = gemini_executor.submit(
+                analyze_with_gemini,
+                debate_name,
+                date,
+                combined_text,
+                keywords_found,
+                api_key
+            )
+            total_api_calls += 1
 
-        # SCHRITT 2: LLM-Analyse
-        print(f"  Analysiere mit Gemini...")
-        last_api_call_time = time.time()
-        llm_has_relation, llm_conf, llm_reasoning, input_tokens, output_tokens = analyze_with_gemini(
-            debate_name,
-            date,
-            combined_text,
-            keywords_found,
-            api_key
-        )
+        pending.append({
+            'debate_id': debate_id,
+            'date': date,
+            'debate_name': debate_name,
+            'keyword_conf': keyword_conf,
+            'keywords_found': keywords_found,
+            'cache_key': cache_key,
+            'cached': cached,
+            'llm_call': llm_call,
+            'result': result
+        })
+
+        log.append("")
+        emit_log(log)
+
+    # SCHRITT 2/3: Gemini-Antworten in Debatten-Reihenfolge einsammeln und kombinieren
+    if pending:
+        print("Sammle Gemini-Antworten ein...\n")
+
+    for entry in pending:
+        log = []
+        keyword_conf = entry['keyword_conf']
+        keywords_found = entry['keywords_found']
+
+        if entry['llm_call'] is None:
+            llm_has_relation, llm_conf, llm_reasoning, sample_input, sample_output = entry['cached']
+            input_tokens, output_tokens = 0, 0
+        else:
+            llm_has_relation, llm_conf, llm_reasoning, input_tokens, output_tokens = entry['llm_call'].result()
+            sample_input, sample_output = input_tokens, output_tokens
+
+            if not llm_reasoning.startswith(LLM_ERROR_PREFIXES):
+                conn_cache.execute(
+                    "INSERT OR IGNORE INTO llm_cache VALUES (?, ?, ?, ?, ?, ?)",
+                    [entry['cache_key'], llm_has_relation, llm_conf, llm_reasoning, input_tokens, output_tokens]
+                )
 
         total_llm_analyzed += 1
         total_input_tokens += input_tokens
         total_output_tokens += output_tokens
-        total_api_calls += 1
+        sample_input_tokens += sample_input
+        sample_output_tokens += sample_output
 
-        print(f"  LLM: {llm_has_relation}, Confidence: {llm_conf:.2f}")
-        print(f"  Tokens: {input_tokens} in, {output_tokens} out")
-        print(f"  Reasoning: {llm_reasoning}")
+        log.append(f"{entry['date']} - {entry['debate_name'][:60]}")
+        log.append(f"  LLM: {llm_has_relation}, Confidence: {llm_conf:.2f}")
+        log.append(f"  Tokens: {input_tokens} in, {output_tokens} out")
+        log.append(f"  Reasoning: {llm_reasoning}")
 
         # SCHRITT 3: Kombiniere Ergebnisse
         brexit_related, final_conf = combine_results(
@@ -364,48 +636,37 @@ def main():
             llm_conf
         )
 
-        print(f"  ✓ Final: Brexit-Bezug = {brexit_related}, Confidence = {final_conf:.2f}")
+        log.append(f"  ✓ Final: Brexit-Bezug = {brexit_related}, Confidence = {final_conf:.2f}")
 
         if brexit_related:
             total_brexit_related += 1
 
         # Speichere Ergebnis
-        results.append({
-            'date': date,
-            'debate': debate_name[:50],
-            'keywords': len(keywords_found),
-            'keyword_conf': keyword_conf,
+        entry['result'].update({
             'llm_conf': llm_conf,
             'final': brexit_related,
             'final_conf': final_conf,
             'reasoning': llm_reasoning
         })
 
-        # Update alle Reden dieser Debatte
-        conn_out.execute("""
-            UPDATE speeches
-            SET
-                brexit_related = ?,
-                brexit_confidence = ?,
-                brexit_keyword_confidence = ?,
-                brexit_llm_confidence = ?,
-                brexit_keywords_found = ?,
-                brexit_llm_reasoning = ?
-            WHERE debate_id = ?
-        """, [
-            brexit_related,
-            final_conf,
-            keyword_conf,
-            llm_conf,
-            ', '.join(keywords_found[:10]),
-            llm_reasoning,
-            debate_id
-        ])
+        # Ergebnis für das gesammelte Update aller Reden dieser Debatte puffern
+        update_buffer["debate_id"].append(entry['debate_id'])
+        update_buffer["brexit_related"].append(brexit_related)
+        update_buffer["brexit_confidence"].append(final_conf)
+        update_buffer["brexit_keyword_confidence"].append(keyword_conf)
+        update_buffer["brexit_llm_confidence"].append(llm_conf)
+        update_buffer["brexit_keywords_found"].append(', '.join(keywords_found[:10]))
+        update_buffer["brexit_llm_reasoning"].append(llm_reasoning)
 
-        conn_out.commit()
         total_processed += 1
 
-        print()
+        log.append("")
+        emit_log(log)
+
+    gemini_executor.shutdown()
+
+    # Alle Ergebnisse in einem Schritt in die Output-Datenbank schreiben
+    apply_debate_updates(conn_out, update_buffer)
 
     # Zeit-Messung
     end_time = time.time()
@@ -424,8 +685,8 @@ def main():
         print(f"  Brexit-Rate:                {total_brexit_related/total_processed*100:.1f}%")
     print(f"\n⏱️  Verarbeitungszeit:")
     print(f"  Gesamt:                     {elapsed_time:.1f} Sekunden ({elapsed_time/60:.1f} Minuten)")
-    if total_llm_analyzed > 0:
-        print(f"  Pro API Call:               {elapsed_time/total_llm_analyzed:.2f} Sekunden")
+    if total_api_calls > 0:
+        print(f"  Pro API Call:               {elapsed_time/total_api_calls:.2f} Sekunden")
 
     # Kosten-Berechnung
     print(f"\n" + "=" * 70)
@@ -454,16 +715,16 @@ def main():
     print("-" * 70)
 
     # Hole Gesamtzahl der Debatten
-    total_all_debates = conn_source.execute("SELECT COUNT(DISTINCT debate_id) FROM debates WHERE major_heading_text IS NOT NULL").fetchone()[0]
+    total_all_debates = conn_out.execute("SELECT COUNT(DISTINCT debate_id) FROM source_db.debates WHERE major_heading_text IS NOT NULL").fetchone()[0]
 
     # Annahme: Gleiche Rate von Debatten mit Keywords
     if total_with_keywords > 0:
         keyword_rate = total_with_keywords / total_processed
         estimated_debates_with_keywords = int(total_all_debates * keyword_rate)
 
-        # Durchschnittliche Tokens pro API Call
-        avg_input_tokens = total_input_tokens / total_api_calls if total_api_calls > 0 else 0
-        avg_output_tokens = total_output_tokens / total_api_calls if total_api_calls > 0 else 0
+        # Durchschnittliche Tokens pro LLM-Analyse (Cache-Treffer mit ihren gespeicherten Tokens)
+        avg_input_tokens = sample_input_tokens / total_llm_analyzed if total_llm_analyzed > 0 else 0
+        avg_output_tokens = sample_output_tokens / total_llm_analyzed if total_llm_analyzed > 0 else 0
 
         estimated_total_input = estimated_debates_with_keywords * avg_input_tokens
         estimated_total_output = estimated_debates_with_keywords * avg_output_tokens
@@ -480,9 +741,9 @@ def main():
         print(f"  Est. Output Tokens:     {estimated_total_output:,.0f}")
         print(f"  Est. Gesamtkosten:      ${estimated_total_cost:.2f}")
 
-        # Zeit-Hochrechnung
-        if total_llm_analyzed > 0:
-            avg_time_per_call = elapsed_time / total_llm_analyzed
+        # Zeit-Hochrechnung (nur mit echten API Calls aussagekräftig)
+        if total_api_calls > 0:
+            avg_time_per_call = elapsed_time / total_api_calls
             estimated_total_time = estimated_debates_with_keywords * avg_time_per_call
             estimated_hours = estimated_total_time / 3600
             estimated_days = estimated_hours / 24
@@ -535,8 +796,8 @@ def main():
     print(f"\n" + "=" * 70)
     print(f"Reden mit Brexit-Bezug: {brexit_speeches:,} von {total_speeches:,}")
 
-    conn_source.close()
     conn_out.close()
+    conn_cache.close()
 
     print(f"\n✓ Test-Ergebnisse gespeichert in: {OUTPUT_DB}")
     print("\nÖffne die Datenbank mit:")